@@ -1,16 +1,37 @@
 #!/usr/bin/env python3
 
-import datetime
-import enum
+import asyncio
+import codecs
+import collections
+import concurrent.futures
+import cProfile
+import gzip
+import hashlib
 import io
 import json
 import logging
+import os
+import random
+import re
+import shutil
+import sqlite3
 import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
 
-from typing import Any, Callable, Iterable, List, Optional, TypeVar, Union
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 
 import aiohttp
 
+from aiotg.models import (  # noqa: F401
+    Audio, CallbackQuery, Chat, ChatAction, ChatType, ChosenInlineResult, Contact, Document, File, InlineQuery,
+    Location, Message, MessageEntity, MessageEntityType, ParseMode, PhotoSize, ResponseBase, Sticker, Update, User,
+    Venue, Video, VideoNote, Voice, WebhookInfo,
+)
+
 
 if sys.version_info < (3, 6):
     raise ImportError("aiotg requires Python 3.6+")
@@ -21,392 +42,37 @@ ChatId = Union[int, str]
 InputFile = Union[bytes, io.IOBase]
 
 
-class ParseMode(enum.Enum):
-    """
-    https://core.telegram.org/bots/api#formatting-options
-    """
-    default = None
-    markdown = "Markdown"
-    html = "HTML"
-
-
-class ChatAction(enum.Enum):
-    """
-    https://core.telegram.org/bots/api#sendchataction
-    """
-    typing = "typing"
-    upload_photo = "upload_photo"
-    record_video = "record_video"
-    upload_video = "upload_video"
-    record_audio = "record_audio"
-    upload_audio = "upload_audio"
-    upload_document = "upload_document"
-    find_location = "find_location"
-
-
-class ChatType(enum.Enum):
-    """
-    https://core.telegram.org/bots/api#chat
-    """
-    private = "private"
-    group = "group"
-    supergroup = "supergroup"
-    channel = "channel"
-
-
-class MessageEntityType(enum.Enum):
-    """
-    https://core.telegram.org/bots/api#messageentity
-    """
-    mention = "mention"
-    hashtag = "hashtag"
-    bot_command = "bot_command"
-    url = "url"
-    email = "email"
-    bold = "bold"
-    italic = "italic"
-    code = "code"
-    pre = "pre"
-    text_link = "text_link"
-    text_mention = "text_mention"
-
-
-class ResponseBase:
-    """
-    Base response object.
-    """
-    __slots__ = ()
-
-    def __repr__(self) -> str:
-        return "%s(%s)" % (self.__class__.__name__, ", ".join(
-            "%s: %r" % (name, getattr(self, name))
-            for name in self.__slots__
-            if getattr(self, name)
-        ))
-
-
-class WebhookInfo(ResponseBase):
-    __slots__ = (
-        "url", "has_custom_certificate", "pending_update_count", "last_error_date",
-        "last_error_message", "max_connections", "allowed_updates",
-    )
-
-    def __init__(self, webhook_info: dict):
-        self.url: str = webhook_info["url"]
-        self.has_custom_certificate: bool = webhook_info["has_custom_certificate"]
-        self.pending_update_count: int = webhook_info["pending_update_count"]
-        self.last_error_date = get_optional(webhook_info, "last_error_date", datetime.datetime.fromtimestamp)
-        self.last_error_message: Optional[str] = webhook_info.get("last_error_message")
-        self.max_connections: Optional[int] = webhook_info.get("max_connections")
-        self.allowed_updates: Optional[List[str]] = webhook_info.get("allowed_updates")
-
-
-class User(ResponseBase):
-    """
-    This object represents a Telegram user or bot.
-    https://core.telegram.org/bots/api#user
-    """
-    __slots__ = ("id", "first_name", "last_name", "username")
-
-    def __init__(self, user: dict):
-        self.id: int = user["id"]
-        self.first_name: str = user["first_name"]
-        self.last_name: Optional[str] = user.get("last_name")
-        self.username: Optional[str] = user.get("username")
-
-
-class Chat(ResponseBase):
-    """
-    This object represents a chat.
-    https://core.telegram.org/bots/api#chat
-    """
-    __slots__ = ("id", "type", "title", "username", "first_name", "last_name")
-
-    def __init__(self, chat: dict):
-        self.id: int = chat["id"]
-        self.type = ChatType(chat["type"])
-        self.title: Optional[str] = chat.get("title")
-        self.username: Optional[str] = chat.get("username")
-        self.first_name: Optional[str] = chat.get("first_name")
-        self.last_name: Optional[str] = chat.get("last_name")
-
-
-class MessageEntity(ResponseBase):
-    """
-    This object represents one special entity in a text message. For example, hashtags, usernames, URLs, etc.
-    https://core.telegram.org/bots/api#messageentity
-    """
-    __slots__ = ("type", "offset", "length", "url", "user")
-
-    def __init__(self, message_entity: dict):
-        self.type = MessageEntityType(message_entity["type"])
-        self.offset: int = message_entity["offset"]
-        self.length: int = message_entity["length"]
-        self.url: Optional[str] = message_entity.get("url")
-        self.user = get_optional(message_entity, "user", User)
-
-    def __len__(self) -> int:
-        return self.length
-
-
-class Audio(ResponseBase):
-    """
-    This object represents an audio file to be treated as music by the Telegram clients.
-    https://core.telegram.org/bots/api#audio
-    """
-    __slots__ = ("file_id", "duration", "performer", "title", "mime_type", "file_size")
-
-    def __init__(self, audio: dict):
-        self.file_id: str = audio["file_id"]
-        self.duration = datetime.timedelta(seconds=audio["duration"])
-        self.performer: Optional[str] = audio.get("performer")
-        self.title: Optional[str] = audio.get("title")
-        self.mime_type: Optional[str] = audio.get("mime_type")
-        self.file_size: Optional[int] = audio.get("file_size")
-
-
-class PhotoSize(ResponseBase):
-    """
-    This object represents one size of a photo or a file / sticker thumbnail.
-    https://core.telegram.org/bots/api#photosize
-    """
-    def __init__(self, photo_size: dict):
-        self.file_id: str = photo_size["file_id"]
-        self.width: int = photo_size["width"]
-        self.height: int = photo_size["height"]
-        self.file_size: Optional[int] = photo_size.get("file_size")
-
-
-class Document(ResponseBase):
-    """
-    This object represents a general file (as opposed to photos, voice messages and audio files).
-    https://core.telegram.org/bots/api#document
-    """
-    __slots__ = ("file_id", "thumbnail", "file_name", "mime_type", "file_size")
-
-    def __init__(self, document: dict):
-        self.file_id: str = document["file_id"]
-        self.thumbnail = get_optional(document, "thumb", PhotoSize)
-        self.file_name: Optional[str] = document.get("file_name")
-        self.mime_type: Optional[str] = document.get("mime_type")
-        self.file_size: Optional[int] = document.get("file_size")
-
-
-class Sticker(ResponseBase):
-    """
-    This object represents a sticker.
-    https://core.telegram.org/bots/api#sticker
-    """
-    __slots__ = ("file_id", "width", "height", "thumbnail", "emoji", "file_size")
-
-    def __init__(self, sticker: dict):
-        self.file_id: str = sticker["file_id"]
-        self.width: int = sticker["width"]
-        self.height: int = sticker["height"]
-        self.thumbnail = get_optional(sticker, "thumb", PhotoSize)
-        self.emoji: Optional[str] = sticker.get("emoji")
-        self.file_size: Optional[int] = sticker.get("file_size")
-
-
-class Video(ResponseBase):
-    """
-    This object represents a video file.
-    https://core.telegram.org/bots/api#video
-    """
-    __slots__ = ("file_id", "width", "height", "duration", "thumbnail", "mime_type", "file_size")
-
-    def __init__(self, video: dict):
-        self.file_id: str = video["file_id"]
-        self.width: int = video["width"]
-        self.height: int = video["height"]
-        self.duration = datetime.timedelta(seconds=video["duration"])
-        self.thumbnail = get_optional(video, "thumb", PhotoSize)
-        self.mime_type: Optional[str] = video.get("mime_type")
-        self.file_size: Optional[int] = video.get("file_size")
-
-
-class Voice(ResponseBase):
-    """
-    This object represents a voice note.
-    https://core.telegram.org/bots/api#voice
-    """
-    __slots__ = ("file_id", "duration", "mime_type", "file_size")
-
-    def __init__(self, voice: dict):
-        self.file_id: str = voice["file_id"]
-        self.duration = datetime.timedelta(seconds=voice["duration"])
-        self.mime_type: Optional[str] = voice.get("mime_type")
-        self.file_size: Optional[int] = voice.get("file_size")
-
-
-class Contact(ResponseBase):
-    """
-    This object represents a voice note.
-    https://core.telegram.org/bots/api#contact
-    """
-    __slots__ = ("phone_number", "first_name", "last_name", "user_id")
-
-    def __init__(self, contact: dict):
-        self.phone_number: str = contact["phone_number"]
-        self.first_name: str = contact["first_name"]
-        self.last_name: Optional[str] = contact.get("last_name")
-        self.user_id: Optional[int] = contact.get("user_id")
-
-
-class Location(ResponseBase):
-    """
-    This object represents a point on the map.
-    https://core.telegram.org/bots/api#location
-    """
-    __slots__ = ("longitude", "latitude")
-
-    def __init__(self, location: dict):
-        self.longitude: float = location["longitude"]
-        self.latitude: float = location["latitude"]
-
-
-class Venue(ResponseBase):
-    """
-    This object represents a venue.
-    https://core.telegram.org/bots/api#venue
-    """
-    __slots__ = ("location", "title", "address", "foursquare_id")
-
-    def __init__(self, venue: dict):
-        self.location = Location(venue["location"])
-        self.title: str = venue["title"]
-        self.address: str = venue["address"]
-        self.foursquare_id: str = venue.get("foursquare_id")
-
-
-class InlineQuery(ResponseBase):
-    """
-    This object represents an incoming inline query.
-    When the user sends an empty query, your bot could return some default or trending results.
-    https://core.telegram.org/bots/api#inlinequery
-    """
-    __slots__ = ("id", "from_", "location", "query", "offset")
-
-    def __init__(self, inline_query: dict):
-        self.id: str = inline_query["id"]
-        self.from_ = User(inline_query["from"])
-        self.location = get_optional(inline_query, "location", Location)
-        self.query: str = inline_query["query"]
-        self.offset: str = inline_query["offset"]  # type: str
-
-
-class ChosenInlineResult(ResponseBase):
-    """
-    Represents a result of an inline query that was chosen by the user and sent to their chat partner.
-    https://core.telegram.org/bots/api#choseninlineresult
-    """
-    __slots__ = ("result_id", "from_", "location", "inline_message_id", "query")
-
-    def __init__(self, chosen_inline_result: dict):
-        self.result_id: str = chosen_inline_result["result_id"]
-        self.from_ = User(chosen_inline_result["from"])
-        self.location = get_optional(chosen_inline_result, "location", Location)
-        self.inline_message_id: Optional[str] = chosen_inline_result.get("inline_message_id")
-        self.query = chosen_inline_result["query"]
-
-
-class CallbackQuery(ResponseBase):
-    """
-    This object represents an incoming callback query from a callback button in an inline keyboard.
-    If the button that originated the query was attached to a message sent by the bot, the field message will be presented.
-    If the button was attached to a message sent via the bot (in inline mode), the field inline_message_id will be presented.
-    https://core.telegram.org/bots/api#callbackquery
-    """
-    __slots__ = ("id", "from_", "message", "inline_message_id", "data")
-
-    def __init__(self, callback_query: dict):
-        self.id: str = callback_query["id"]
-        self.from_ = User(callback_query["from"])
-        self.message = get_optional(callback_query, "message", Message)
-        self.inline_message_id: Optional[str] = callback_query.get("inline_message_id")
-        self.data: str = callback_query["data"]
-
-
-class Message(ResponseBase):
-    """
-    This object represents a message.
-    https://core.telegram.org/bots/api#message
-    """
-    __slots__ = (
-        "id", "from_", "date", "chat", "forward_from", "forward_from_chat", "forward_date", "reply_to_message",
-        "edit_date", "text", "entities", "audio", "document", "photo", "sticker", "video", "voice",
-        "caption", "contact", "location", "venue", "new_chat_member", "left_chat_member", "new_chat_title",
-        "new_chat_photo", "delete_chat_photo", "group_chat_created", "supergroup_chat_created",
-        "channel_chat_created", "migrate_to_chat_id", "migrate_from_chat_id", "pinned_message",
-    )
-
-    def __init__(self, message: dict):
-        self.id: int = message["message_id"]
-        self.from_ = get_optional(message, "from", User)
-        self.date = datetime.datetime.fromtimestamp(message["date"])
-        self.chat = Chat(message["chat"])
-        self.forward_from = get_optional(message, "forward_from", User)
-        self.forward_from_chat = get_optional(message, "forward_from_chat", Chat)
-        self.forward_date = get_optional(message, "forward_date", datetime.datetime.fromtimestamp)
-        self.reply_to_message = get_optional(message, "reply_to_message", Message)
-        self.edit_date = get_optional(message, "edit_date", datetime.datetime.fromtimestamp)
-        self.text: Optional[str] = message.get("text")
-        self.entities = get_optional_array(message, "entities", MessageEntity)
-        self.audio = get_optional(message, "audio", Audio)
-        self.document = get_optional(message, "document", Document)
-        self.photo = get_optional_array(message, "photo", PhotoSize)
-        self.sticker = get_optional(message, "sticker", Sticker)
-        self.video = get_optional(message, "video", Video)
-        self.voice = get_optional(message, "voice", Voice)
-        self.caption: Optional[str] = message.get("caption")
-        self.contact = get_optional(message, "contact", Contact)
-        self.location = get_optional(message, "location", Location)
-        self.venue = get_optional(message, "venue", Venue)
-        self.new_chat_member = get_optional(message, "new_chat_member", User)
-        self.left_chat_member = get_optional(message, "left_chat_member", User)
-        self.new_chat_title: Optional[str] = message.get("new_chat_title")
-        self.new_chat_photo = get_optional_array(message, "new_chat_photo", PhotoSize)
-        self.delete_chat_photo: bool = message.get("delete_chat_photo", False)
-        self.group_chat_created: bool = message.get("group_chat_created", False)
-        self.supergroup_chat_created: bool = message.get("supergroup_chat_created", False)
-        self.channel_chat_created: bool = message.get("channel_chat_created", False)
-        self.migrate_to_chat_id: Optional[int] = message.get("migrate_to_chat_id")
-        self.migrate_from_chat_id: Optional[int] = message.get("migrate_from_chat_id")
-        self.pinned_message = get_optional(message, "pinned_message", Message)
-
-
-class Update(ResponseBase):
-    """
-    This object represents an incoming update.
-    Only one of the optional fields can be present in any given update.
-    https://core.telegram.org/bots/api#update
-    """
-    __slots__ = (
-        "id", "message", "edited_message", "channel_post", "edited_channel_post", "inline_query",
-        "chosen_inline_result", "callback_query",
-    )
-
-    def __init__(self, update: dict):
-        self.id: int = update["update_id"]
-        self.message = get_optional(update, "message", Message)
-        self.edited_message = get_optional(update, "edited_message", Message)
-        self.channel_post = get_optional(update, "channel_post", Message)
-        self.edited_channel_post = get_optional(update, "edited_channel_post", Message)
-        self.inline_query = get_optional(update, "inline_query", InlineQuery)
-        self.chosen_inline_result = get_optional(update, "chosen_inline_result", ChosenInlineResult)
-        self.callback_query = get_optional(update, "callback_query", CallbackQuery)
-
-
 class Telegram:
     """
     Telegram Bot API wrapper.
+    `request_timeout` limits every Bot API request, unless the method is listed in `method_timeouts`.
+    Uploads are only limited while connecting and waiting for the response.
+    Long polling requests are limited by the polling timeout plus `poll_timeout_margin`.
+    If `batch_window` is set, messages and documents are batched, see `OutboundBatcher`.
     """
 
     logger = logging.getLogger(__name__)
+    upload_methods = frozenset({"sendDocument", "sendMediaGroup"})
 
-    def __init__(self, token: str, connector=None):
+    def __init__(
+        self,
+        token: str,
+        connector=None,
+        file_cache: Optional["FileCache"] = None,
+        request_timeout: float = 30.0,
+        method_timeouts: Optional[Dict[str, float]] = None,
+        poll_timeout_margin: float = 5.0,
+        batch_window: Optional[float] = None,
+    ):
         self.url = f"https://api.telegram.org/bot{token}/{{}}"
+        self.file_url = f"https://api.telegram.org/file/bot{token}/{{}}"
         self.session = aiohttp.ClientSession(connector=connector)
+        self.file_cache = file_cache
+        self.request_timeout = request_timeout
+        self.method_timeouts = method_timeouts or {}
+        self.poll_timeout_margin = poll_timeout_margin
+        self.batcher = OutboundBatcher(self, batch_window) if batch_window else None
+        self.profiler: Optional[HandlerProfiler] = None
 
     async def __aenter__(self):
         await self.session.__aenter__()
@@ -425,10 +91,44 @@ class Telegram:
         Use this method to receive incoming updates using long polling.
         https://core.telegram.org/bots/api#getupdates
         """
-        return [
-            Update(update)
-            for update in await self.make_request("getUpdates", offset=offset, limit=limit, timeout=timeout)
-        ]
+        return [Update(update) for update in await self.get_raw_updates(offset, limit, timeout)]
+
+    async def get_raw_updates(self, offset: int, limit: int, timeout: int) -> List[dict]:
+        """
+        Same as `get_updates` but returns raw update payloads.
+        """
+        return await self.make_request(
+            "getUpdates", request_timeout=timeout + self.poll_timeout_margin, offset=offset, limit=limit, timeout=timeout)
+
+    async def iter_updates(self, offset: int, limit: int, timeout: int) -> AsyncIterator[Update]:
+        """
+        Same as `get_updates` but yields every update as soon as it is decoded from the response body.
+        """
+        async for update in self.iter_raw_updates(offset, limit, timeout):
+            yield Update(update)
+
+    async def iter_raw_updates(self, offset: int, limit: int, timeout: int) -> AsyncIterator[dict]:
+        """
+        Same as `get_raw_updates` but decodes the response body incrementally.
+        """
+        method, params = "getUpdates", {"offset": offset, "limit": limit, "timeout": timeout}
+        self.logger.debug("%s(%r)", method, params)
+        # Only limit the time between chunks, since updates are handled while the body is being received.
+        request_timeout = aiohttp.ClientTimeout(total=None, sock_read=timeout + self.poll_timeout_margin)
+        async with self.session.post(self.url.format(method), data=params, timeout=request_timeout) as response:
+            decoder = ResultArrayDecoder()
+            async for chunk in response.content.iter_any():
+                for update in decoder.feed(chunk):
+                    self.logger.debug("%s: %s", method, update)
+                    yield update
+            try:
+                updates = decoder.close()
+            except TelegramException:
+                self.logger.error("%s: %s", method, decoder.buffer)
+                raise
+            for update in updates:
+                self.logger.debug("%s: %s", method, update)
+                yield update
 
     async def send_message(
         self,
@@ -439,16 +139,24 @@ class Telegram:
         reply_to_message_id=None,
         reply_markup=None,
     ) -> Message:
-        params = {"chat_id": chat_id, "text": text}
-        if parse_mode != ParseMode.default:
-            params["parse_mode"] = parse_mode.value
-        if disable_web_page_preview:
-            params["disable_web_page_preview"] = disable_web_page_preview
-        if reply_to_message_id is not None:
-            params["reply_to_message_id"] = reply_to_message_id
-        if reply_markup is not None:
-            params["reply_markup"] = reply_markup
-        return Message(await self.make_request("sendMessage", **params))
+        return await self.send("sendMessage", get_message_params(
+            chat_id, text, parse_mode, disable_web_page_preview, reply_to_message_id, reply_markup))
+
+    def queue_message(
+        self,
+        chat_id: ChatId,
+        text: str,
+        parse_mode=ParseMode.default,
+        disable_web_page_preview=False,
+        reply_to_message_id=None,
+        reply_markup=None,
+    ) -> asyncio.Future:
+        """
+        Same as `send_message`, but does not wait for the message to be sent.
+        Returns the future of the sent message.
+        """
+        return self.queue("sendMessage", get_message_params(
+            chat_id, text, parse_mode, disable_web_page_preview, reply_to_message_id, reply_markup))
 
     async def edit_message_text(
         self,
@@ -515,7 +223,7 @@ class Telegram:
             params["reply_to_message_id"] = reply_to_message_id
         if reply_markup:
             params["reply_markup"] = reply_markup
-        return Message(await self.make_request("sendLocation", **params))
+        return await self.send("sendLocation", params)
 
     # FIXME: untested.
     async def set_webhook(
@@ -580,40 +288,242 @@ class Telegram:
         this limit may be changed in the future.
         https://core.telegram.org/bots/api#senddocument
         """
-        params = {"chat_id": str(chat_id), "document": document}
-        if caption:
-            params["caption"] = caption
-        if disable_notification:
-            params["disable_notification"] = str(disable_notification)
-        if reply_to_message_id:
-            params["reply_to_message_id"] = str(reply_to_message_id)
-        if reply_markup:
-            params["reply_markup"] = reply_markup
-        return Message(await self.make_request("sendDocument", **params))
+        return await self.send("sendDocument", get_document_params(
+            chat_id, document, caption, disable_notification, reply_to_message_id, reply_markup))
+
+    def queue_document(
+        self,
+        chat_id: ChatId,
+        document: Union[str, InputFile],
+        caption: Optional[str] = None,
+        disable_notification: bool = False,
+        reply_to_message_id: Optional[int] = None,
+        reply_markup: Optional[str] = None,
+    ) -> asyncio.Future:
+        """
+        Same as `send_document`, but does not wait for the document to be sent.
+        Returns the future of the sent message.
+        """
+        return self.queue("sendDocument", get_document_params(
+            chat_id, document, caption, disable_notification, reply_to_message_id, reply_markup))
+
+    async def send(self, method: str, params: dict) -> Message:
+        """
+        Sends a message to the chat through the batcher, if enabled.
+        """
+        if self.batcher is not None:
+            if self.batcher.accepts(method, params):
+                return await self.batcher.send(method, params)
+            # Keep the order of messages sent to the chat.
+            await self.batcher.flush(params["chat_id"])
+        return Message(await self.make_request(method, **params))
+
+    def queue(self, method: str, params: dict) -> asyncio.Future:
+        """
+        Queues a message to the chat without waiting. Returns the future of the sent message.
+        Queued messages are batched within the batch window, if enabled.
+        """
+        if self.batcher is not None and self.batcher.accepts(method, params):
+            return self.batcher.queue(method, params)
+        return asyncio.ensure_future(self.send(method, params))
+
+    async def get_file(self, file_id: str) -> File:
+        """
+        Use this method to get basic info about a file and prepare it for downloading.
+        For the moment, bots can download files of up to 20MB in size.
+        https://core.telegram.org/bots/api#getfile
+        """
+        return File(await self.make_request("getFile", file_id=file_id))
 
-    async def make_request(self, method: str, **kwargs) -> Union[dict, bool]:
+    async def iter_file(self, file: Union[str, ResponseBase], chunk_size: int = 65536) -> AsyncIterator[bytes]:
+        """
+        Downloads the file and yields its content chunk by chunk.
+        The file is specified by its identifier or by any object with `file_id`, e.g. `File`, `Document` or `PhotoSize`.
+        """
+        file_id = get_file_id(file)
+        cached_file = self.file_cache.open(file_id) if self.file_cache is not None else None
+        if cached_file is not None:
+            with cached_file:
+                for chunk in iter(lambda: cached_file.read(chunk_size), b""):
+                    yield chunk
+            return
+        if not isinstance(file, File) or not file.file_path:
+            file = await self.get_file(file_id)
+        request_timeout = aiohttp.ClientTimeout(total=None, sock_read=self.request_timeout)
+        # Also write the chunks into the cache, the file gets cached once it is completely downloaded.
+        cache_file, cache_path = self.file_cache.create_temporary() if self.file_cache is not None else (None, None)
+        try:
+            async with self.session.get(self.file_url.format(file.file_path), timeout=request_timeout) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    if cache_file is not None:
+                        cache_file.write(chunk)
+                    yield chunk
+            if cache_file is not None:
+                cache_file.close()
+                cache_file = None
+                await asyncio.get_event_loop().run_in_executor(None, self.file_cache.commit, file_id, cache_path)
+        finally:
+            if cache_file is not None:
+                cache_file.close()
+                os.remove(cache_path)
+
+    async def download_file(
+        self,
+        file: Union[str, ResponseBase],
+        path: str,
+        chunk_size: int = 65536,
+        part_size: int = 1048576,
+        parallel: int = 4,
+    ) -> str:
+        """
+        Downloads the file to the path and returns the path.
+        The file is specified by its identifier or by any object with `file_id`, e.g. `File`, `Document` or `PhotoSize`.
+        Files larger than `part_size` are downloaded with up to `parallel` simultaneous ranged requests.
+        """
+        file_id = get_file_id(file)
+        cached_file = self.file_cache.open(file_id) if self.file_cache is not None else None
+        if cached_file is not None:
+            def copy_cached_file():
+                with cached_file, open(path, "wb") as output:
+                    shutil.copyfileobj(cached_file, output)
+
+            await asyncio.get_event_loop().run_in_executor(None, copy_cached_file)
+            return path
+        if not isinstance(file, File) or not file.file_path:
+            file = await self.get_file(file_id)
+        url = self.file_url.format(file.file_path)
+        temporary_path = f"{path}.part"
+        with open(temporary_path, "wb") as output:
+            if file.file_size and file.file_size > part_size and parallel > 1:
+                output.truncate(file.file_size)
+            else:
+                part_size = None
+        try:
+            if not await self.download_part(url, temporary_path, 0, part_size, chunk_size) and part_size:
+                # The server supports ranges, download the remaining parts simultaneously.
+                semaphore = asyncio.Semaphore(parallel)
+
+                async def download_part(start: int):
+                    async with semaphore:
+                        size = min(part_size, file.file_size - start)
+                        await self.download_part(url, temporary_path, start, size, chunk_size)
+
+                await asyncio.gather(*(download_part(start) for start in range(part_size, file.file_size, part_size)))
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        if self.file_cache is not None:
+            await asyncio.get_event_loop().run_in_executor(None, self.file_cache.put, file_id, path)
+        return path
+
+    async def download_part(self, url: str, path: str, start: int, size: Optional[int], chunk_size: int) -> bool:
+        """
+        Downloads the byte range into the existing file, or the whole file if `size` is `None`.
+        Returns `True` if the whole file has been downloaded.
+        """
+        headers = {"Range": f"bytes={start}-{start + size - 1}"} if size is not None else None
+        request_timeout = aiohttp.ClientTimeout(total=None, sock_read=self.request_timeout)
+        async with self.session.get(url, headers=headers, timeout=request_timeout) as response:
+            response.raise_for_status()
+            is_whole_file = response.status != 206
+            with open(path, "r+b") as output:
+                if is_whole_file:
+                    output.truncate()
+                else:
+                    output.seek(start)
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    output.write(chunk)
+        return is_whole_file
+
+    async def make_request(self, method: str, request_timeout: Optional[float] = None, **kwargs) -> Union[dict, bool]:
         """
         Posts the request to Telegram Bot API.
+        `request_timeout` overrides the configured timeout of the method.
         """
         self.logger.debug("%s(%r)", method, kwargs)
-        async with self.session.post(self.url.format(method), data=kwargs) as response:
-            payload = await response.json()
-            if payload["ok"]:
-                self.logger.debug("%s: %s", method, payload)
-                return payload["result"]
-            else:
-                self.logger.error("%s: %s", method, payload)
-                raise TelegramException(payload["description"])
+        if request_timeout is None:
+            request_timeout = self.method_timeouts.get(method)
+        if request_timeout is not None:
+            timeout = aiohttp.ClientTimeout(total=request_timeout)
+        elif method in self.upload_methods:
+            # Uploads may take long, so only limit connecting and waiting for the response.
+            timeout = aiohttp.ClientTimeout(
+                total=None, sock_connect=self.request_timeout, sock_read=self.request_timeout)
+        else:
+            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        started_at = time.perf_counter()
+        try:
+            async with self.session.post(self.url.format(method), data=kwargs, timeout=timeout) as response:
+                payload = await response.json()
+        finally:
+            if self.profiler is not None:
+                self.profiler.record_request(method, time.perf_counter() - started_at)
+        if payload["ok"]:
+            self.logger.debug("%s: %s", method, payload)
+            return payload["result"]
+        else:
+            self.logger.error("%s: %s", method, payload)
+            raise TelegramException(payload["description"])
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.batcher is not None:
+            await self.batcher.flush_all()
         await self.session.__aexit__(exc_type, exc_val, exc_tb)
 
 
+class StubTelegram(Telegram):
+    """
+    Offline Telegram stand-in which answers all requests locally. Used to replay recorded updates.
+    """
+
+    message_methods = frozenset({"sendMessage", "editMessageText", "sendLocation", "sendDocument"})
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__("stub")
+        self.latency = latency
+        self.request_counts: Dict[str, int] = collections.Counter()
+        self.last_message_id = 0
+
+    async def make_request(self, method: str, request_timeout: Optional[float] = None, **kwargs) -> Union[dict, bool]:
+        """
+        Pretends to post the request to Telegram Bot API.
+        """
+        self.logger.debug("%s(%r)", method, kwargs)
+        self.request_counts[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method in self.message_methods:
+            return self.make_message(kwargs)
+        if method == "sendMediaGroup":
+            return [self.make_message(kwargs) for _ in json.loads(kwargs["media"])]
+        if method == "getMe":
+            return {"id": 0, "first_name": "Stub", "username": "stub_bot"}
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        if method == "getUpdates":
+            return []
+        return True
+
+    def make_message(self, params: dict) -> dict:
+        self.last_message_id += 1
+        return {
+            "message_id": self.last_message_id,
+            "date": int(time.time()),
+            "chat": {"id": params.get("chat_id", 0), "type": ChatType.private.value},
+            "text": params.get("text"),
+        }
+
+
 class Bot:
     """
     Higher-level bot API.
     """
 
+    # Conversation states, provided by the runner.
+    state: Optional["StateStore"] = None
+
     # noinspection PyMethodMayBeStatic
     async def on_start(self, telegram: Telegram):
         """
@@ -644,19 +554,42 @@ class SimpleBot(Bot):
 class LongPollingRunner:
     """
     Provides updates to bot via long polling.
+    Handlers which take longer than `handler_timeout` seconds are cancelled.
     https://core.telegram.org/bots/api#getupdates
     """
 
-    def __init__(self, telegram: Telegram, bot: Bot, limit: int = 100, timeout: int = 5):
+    def __init__(
+        self,
+        telegram: Telegram,
+        bot: Bot,
+        limit: int = 100,
+        timeout: int = 5,
+        recorder: Optional["UpdateRecorder"] = None,
+        stream: bool = False,
+        state: Optional["StateStore"] = None,
+        profiler: Optional["HandlerProfiler"] = None,
+        handler_timeout: Optional[float] = None,
+    ):
         self.limit = limit
         self.timeout = timeout
         self.telegram = telegram
         self.bot = bot
+        self.recorder = recorder
+        self.stream = stream
+        self.state = state
+        self.profiler = profiler
+        self.handler_timeout = handler_timeout
         self.offset = 0
         self.is_stopped = False
 
     async def __aenter__(self):
         await self.telegram.__aenter__()
+        if self.state is not None:
+            self.bot.state = self.state
+            self.state.start()
+        if self.profiler is not None:
+            self.telegram.profiler = self.profiler
+            self.profiler.start()
         return self
 
     async def run(self):
@@ -671,26 +604,890 @@ class LongPollingRunner:
         """
         Performs single updates loop.
         """
+        if self.stream:
+            return await self.stream_loop()
         try:
-            updates = await self.telegram.get_updates(self.offset, self.limit, self.timeout)
+            raw_updates = await self.telegram.get_raw_updates(self.offset, self.limit, self.timeout)
+            if self.recorder is not None:
+                self.recorder.write(raw_updates)
+            updates = [Update(update) for update in raw_updates]
         except Exception as ex:
             logging.error("Failed to get updates.", exc_info=ex)
             return
         for update in updates:
+            await self.handle(update)
+
+    async def stream_loop(self):
+        """
+        Performs single updates loop handling every update as soon as it is decoded.
+        """
+        try:
+            async for raw_update in self.telegram.iter_raw_updates(self.offset, self.limit, self.timeout):
+                if self.recorder is not None:
+                    self.recorder.write([raw_update])
+                await self.handle(Update(raw_update))
+        except Exception as ex:
+            logging.error("Failed to get updates.", exc_info=ex)
+
+    async def handle(self, update: Update):
+        """
+        Passes the update to the bot.
+        """
+        try:
+            coroutine = self.bot.on_update(self.telegram, update)
+            if self.profiler is not None:
+                coroutine = self.profiler.profile_update(coroutine, update)
+            if self.handler_timeout is not None:
+                await self.run_with_deadline(coroutine, update)
+            else:
+                await coroutine
+        except Exception as ex:
+            logging.error("Error while handling update.", exc_info=ex)
+        self.offset = update.id + 1
+
+    async def run_with_deadline(self, coroutine, update: Update):
+        """
+        Awaits the handler and cancels it if it is not finished in `handler_timeout` seconds.
+        """
+        task = asyncio.ensure_future(coroutine)
+        try:
+            await asyncio.wait([task], timeout=self.handler_timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if task.done():
+            return task.result()
+        logging.error("Update #%d is not handled in %.1fs, cancelling the handler.", update.id, self.handler_timeout)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        """
+        Stops accepting new updates.
+        """
+        self.is_stopped = True
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.state is not None:
+            await self.state.close()
+        if self.profiler is not None:
+            self.profiler.stop()
+        await self.telegram.__aexit__(exc_type, exc_val, exc_tb)
+
+
+class UpdateRecorder:
+    """
+    Appends raw update payloads to a gzip-compressed log.
+    Each line is a JSON array of the receive timestamp and the update payload.
+    Every batch is written as a separate gzip member, so the log stays readable if the process gets killed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        repair_update_log(path)
+        self.file = open(path, "ab")
+
+    def write(self, updates: Iterable[dict]):
+        """
+        Appends the updates to the log.
+        """
+        timestamp = time.time()
+        lines = "".join(
+            json.dumps([timestamp, update], ensure_ascii=False, separators=(",", ":")) + "\n"
+            for update in updates
+        )
+        if lines:
+            self.file.write(gzip.compress(lines.encode("utf-8")))
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def repair_update_log(path: str):
+    """
+    Re-compresses the unterminated last gzip member of the log, which is left if the process was killed.
+    Otherwise, appended members would make the rest of the log unreadable.
+    """
+    try:
+        file = open(path, "r+b")
+    except FileNotFoundError:
+        return
+    with file:
+        size = get_gzip_members_size(file)
+        file.seek(size)
+        tail = file.read()
+        if not tail:
+            return
+        logging.warning("Update log '%s' is truncated, repairing.", path)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            lines = decompressor.decompress(tail)
+        except zlib.error:
+            lines = b""
+        lines = lines[:lines.rfind(b"\n") + 1]
+        file.seek(size)
+        file.truncate()
+        if lines:
+            file.write(gzip.compress(lines))
+
+
+def read_update_log(path: str) -> Iterator[Tuple[float, dict]]:
+    """
+    Reads `(timestamp, update)` pairs written by `UpdateRecorder`.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                timestamp, update = json.loads(line)
+                yield timestamp, update
+        except EOFError:
+            logging.warning("Update log '%s' is truncated.", path)
+        except (OSError, zlib.error) as ex:
+            # `gzip.BadGzipFile` is an `OSError`.
+            logging.warning("Update log '%s' is corrupted: %s", path, ex)
+
+
+class ReplayReport:
+    """
+    Handler performance figures collected by `ReplayRunner`.
+    """
+
+    def __init__(self, latencies: List[float], elapsed: float, errors: int):
+        self.latencies = sorted(latencies)
+        self.elapsed = elapsed
+        self.errors = errors
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Handled updates per second.
+        """
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """
+        Handler latency percentile in seconds, nearest-rank method.
+        """
+        if not self.latencies:
+            return 0.0
+        rank = max(int(round(percent / 100.0 * len(self.latencies))), 1)
+        return self.latencies[min(rank, len(self.latencies)) - 1]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.count} updates ({self.errors} failed) in {self.elapsed:.3f}s, {self.throughput:.1f} updates/s, "
+            f"latency p50 {self.percentile(50) * 1000:.2f}ms, p90 {self.percentile(90) * 1000:.2f}ms, "
+            f"p99 {self.percentile(99) * 1000:.2f}ms, max {self.percentile(100) * 1000:.2f}ms"
+        )
+
+
+class ReplayRunner:
+    """
+    Feeds updates recorded by `UpdateRecorder` to a bot, as fast as possible or at the original pace.
+    """
+
+    def __init__(
+        self,
+        telegram: Telegram,
+        bot: Bot,
+        path: str,
+        realtime: bool = False,
+        state: Optional["StateStore"] = None,
+    ):
+        self.telegram = telegram
+        self.bot = bot
+        self.path = path
+        self.realtime = realtime
+        self.state = state
+
+    async def __aenter__(self):
+        await self.telegram.__aenter__()
+        if self.state is not None:
+            self.bot.state = self.state
+            self.state.start()
+        return self
+
+    async def run(self) -> ReplayReport:
+        """
+        Replays the whole log and returns the handler performance report.
+        """
+        await self.bot.on_start(self.telegram)
+        latencies = []
+        errors = 0
+        first_timestamp = None
+        started_at = time.perf_counter()
+        for timestamp, payload in read_update_log(self.path):
+            if self.realtime:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                delay = (timestamp - first_timestamp) - (time.perf_counter() - started_at)
+                if delay > 0.0:
+                    await asyncio.sleep(delay)
+            update = Update(payload)
+            handle_started_at = time.perf_counter()
             try:
                 await self.bot.on_update(self.telegram, update)
             except Exception as ex:
+                errors += 1
                 logging.error("Error while handling update.", exc_info=ex)
-            self.offset = update.id + 1
+            latencies.append(time.perf_counter() - handle_started_at)
+        return ReplayReport(latencies, time.perf_counter() - started_at, errors)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.state is not None:
+            await self.state.close()
+        await self.telegram.__aexit__(exc_type, exc_val, exc_tb)
+
+
+class StateBackend:
+    """
+    Persistent storage of JSON-encoded states for `StateStore`. Override these methods in your class.
+    """
+
+    async def load(self, key: str) -> Optional[str]:
+        """
+        Returns the stored state or `None` if there is no state for the key.
+        """
+        return None
+
+    async def save(self, states: Dict[str, Optional[str]]):
+        """
+        Stores the batch of states. `None` means that the state must be deleted.
+        """
+        pass
+
+    async def close(self):
+        """
+        Releases the resources.
+        """
+        pass
+
+
+class SqliteStateBackend(StateBackend):
+    """
+    Stores states in a SQLite database. Queries are run in a dedicated thread.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS states (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.connection.commit()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def load(self, key: str) -> Optional[str]:
+        row = await self.execute(self.select, key)
+        return row[0] if row is not None else None
+
+    async def save(self, states: Dict[str, Optional[str]]):
+        await self.execute(self.upsert, states)
+
+    async def close(self):
+        await self.execute(self.connection.close)
+        self.executor.shutdown()
+
+    async def execute(self, function: Callable[..., T], *args) -> T:
+        return await asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+
+    def select(self, key: str) -> Optional[Tuple[str]]:
+        return self.connection.execute("SELECT value FROM states WHERE key = ?", (key, )).fetchone()
+
+    def upsert(self, states: Dict[str, Optional[str]]):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO states (key, value) VALUES (?, ?)",
+                [(key, value) for key, value in states.items() if value is not None],
+            )
+            self.connection.executemany(
+                "DELETE FROM states WHERE key = ?",
+                [(key, ) for key, value in states.items() if value is None],
+            )
+
+
+class StateStore:
+    """
+    Per-chat or per-user states cached in memory and persisted with write-behind.
+    States are JSON-serializable dictionaries. The most recently used ones are kept in memory,
+    changed ones are flushed to the backend in batches, either periodically or once enough of them are changed.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        capacity: int = 10000,
+        flush_interval: float = 1.0,
+        flush_size: int = 100,
+    ):
+        self.backend = backend
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.cache: Dict[str, dict] = collections.OrderedDict()
+        self.dirty: Dict[str, Optional[dict]] = {}
+        self.flushing: Dict[str, Optional[str]] = {}
+        self.locks: Dict[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        # Number of pending loads and number of changes made while loading, by key.
+        self.loads: Dict[str, List[int]] = {}
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Future] = None
+
+    def start(self):
+        """
+        Starts periodic flushing.
+        """
+        self.flush_task = asyncio.ensure_future(self.run_flushes())
+
+    async def get(self, key: ChatId) -> dict:
+        """
+        Returns the state. The empty state is returned if there is no state yet.
+        Call `mark_dirty` after changing it, or use `edit` instead.
+        """
+        key = str(key)
+        while True:
+            state = self.cache.get(key)
+            if state is not None:
+                self.cache.move_to_end(key)
+                return state
+            if key in self.dirty:
+                state = self.dirty[key]
+                break
+            if key in self.flushing:
+                value = self.flushing[key]
+            else:
+                load = self.loads.setdefault(key, [0, 0])
+                load[0] += 1
+                changes = load[1]
+                try:
+                    value = await self.backend.load(key)
+                finally:
+                    load[0] -= 1
+                    if not load[0]:
+                        del self.loads[key]
+                if key in self.cache:
+                    # The state has been loaded or set concurrently.
+                    return self.cache[key]
+                if load[1] != changes:
+                    # The state has been changed while loading, so the loaded value may be outdated.
+                    continue
+            state = json.loads(value) if value is not None else None
+            break
+        if state is None:
+            state = {}
+        self.put(key, state)
+        return state
+
+    def set(self, key: ChatId, state: dict):
+        """
+        Replaces the state.
+        """
+        key = str(key)
+        self.put(key, state)
+        self.mark_dirty(key)
+        self.mark_changed(key)
+
+    def delete(self, key: ChatId):
+        """
+        Deletes the state.
+        """
+        key = str(key)
+        self.cache.pop(key, None)
+        self.dirty[key] = None
+        self.mark_changed(key)
+        self.flush_if_needed()
+
+    def mark_dirty(self, key: ChatId):
+        """
+        Schedules the cached state to be persisted.
+        """
+        key = str(key)
+        if key in self.cache:
+            self.dirty[key] = self.cache[key]
+            self.flush_if_needed()
+
+    def edit(self, key: ChatId) -> "StateEditor":
+        """
+        Returns asynchronous context manager which locks the state, provides it and marks it as dirty on exit,
+        unless the block raises.
+        Use it when updates of the same chat can be handled concurrently.
+        """
+        key = str(key)
+        lock = self.locks.get(key)
+        if lock is None:
+            lock = self.locks[key] = asyncio.Lock()
+        return StateEditor(self, key, lock)
+
+    def put(self, key: str, state: dict):
+        self.cache[key] = state
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.capacity:
+            # Evicted dirty states are still kept in `dirty` until flushed.
+            self.cache.popitem(last=False)
+
+    def mark_changed(self, key: str):
+        load = self.loads.get(key)
+        if load is not None:
+            load[1] += 1
+
+    def flush_if_needed(self):
+        if len(self.dirty) >= self.flush_size and not self.flush_lock.locked():
+            asyncio.ensure_future(self.try_flush())
+
+    async def flush(self):
+        """
+        Persists all changed states.
+        """
+        async with self.flush_lock:
+            if not self.dirty:
+                return
+            states, self.dirty = self.dirty, {}
+            self.flushing = {key: json.dumps(state) if state is not None else None for key, state in states.items()}
+            try:
+                await self.backend.save(self.flushing)
+            except BaseException:
+                # Also keep the states if the flush is cancelled.
+                for key, state in states.items():
+                    self.dirty.setdefault(key, state)
+                raise
+            finally:
+                self.flushing = {}
+            self.logger.debug("Flushed %d states.", len(states))
+
+    async def try_flush(self):
+        try:
+            await self.flush()
+        except Exception as ex:
+            self.logger.error("Failed to flush states.", exc_info=ex)
+
+    async def run_flushes(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.try_flush()
+
+    async def close(self):
+        """
+        Stops periodic flushing, flushes the remaining states and closes the backend.
+        """
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+        await self.backend.close()
+
+
+class StateEditor:
+    """
+    See `StateStore.edit`.
+    """
+
+    def __init__(self, store: StateStore, key: str, lock: asyncio.Lock):
+        self.store = store
+        self.key = key
+        self.lock = lock
+        self.state: Optional[dict] = None
+
+    async def __aenter__(self) -> dict:
+        await self.lock.acquire()
+        try:
+            self.state = await self.store.get(self.key)
+        except Exception:
+            self.lock.release()
+            raise
+        return self.state
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                # The state might have been evicted in the meantime.
+                self.store.set(self.key, self.state)
+        finally:
+            self.lock.release()
+
+
+class HandlerProfiler:
+    """
+    Times update handlers and Bot API requests made by them.
+    Stacks of handlers which take longer than `threshold` seconds are sampled every `interval` seconds
+    and written in the collapsed stack format (suitable for flamegraph tools).
+    A `sample_rate` fraction of all handlers is profiled with `cProfile` and written in the pstats format.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, directory: str, threshold: float = 1.0, sample_rate: float = 0.0, interval: float = 0.005):
+        self.directory = directory
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.requests: List[Tuple[str, float]] = []
+        self.samples: Dict[str, int] = collections.Counter()
+        self.samples_lock = threading.Lock()
+        self.coroutine = None
+        self.thread_id: Optional[int] = None
+        self.is_stopped = False
+
+    def start(self):
+        """
+        Starts the stack sampling thread.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread_id = threading.get_ident()
+        self.is_stopped = False
+        threading.Thread(target=self.run_sampling, name="aiotg-profiler", daemon=True).start()
 
     def stop(self):
         """
-        Stops accepting new updates.
+        Stops the stack sampling thread.
         """
         self.is_stopped = True
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.telegram.__aexit__(exc_type, exc_val, exc_tb)
+    async def profile_update(self, coroutine, update: Update):
+        """
+        Awaits the handler coroutine and reports it if it is slow or sampled.
+        """
+        self.requests = []
+        with self.samples_lock:
+            self.samples = collections.Counter()
+        profile = cProfile.Profile() if random.random() < self.sample_rate else None
+        self.coroutine = coroutine
+        started_at = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            await coroutine
+        finally:
+            if profile is not None:
+                profile.disable()
+            elapsed = time.perf_counter() - started_at
+            self.coroutine = None
+            if elapsed >= self.threshold or profile is not None:
+                self.report(update, elapsed, profile)
+
+    def record_request(self, method: str, elapsed: float):
+        """
+        Records the Bot API request time. Only requests made by handlers are taken into account,
+        long polling requests are expected to be slow.
+        """
+        if self.coroutine is None:
+            return
+        self.requests.append((method, elapsed))
+        if elapsed >= self.threshold:
+            self.logger.warning("Slow request %s: %.3fs.", method, elapsed)
+
+    def report(self, update: Update, elapsed: float, profile: Optional[cProfile.Profile]):
+        update_type = next((name for name in Update.__slots__[1:] if getattr(update, name) is not None), "unknown")
+        chat_id = get_chat_id(update)
+        methods = ",".join(method for method, _ in self.requests)
+        path = os.path.join(self.directory, f"{int(time.time() * 1000)}-{update.id}-{update_type}")
+        if profile is not None:
+            profile.dump_stats(f"{path}.pstats")
+        if elapsed >= self.threshold:
+            with self.samples_lock:
+                samples, self.samples = self.samples, collections.Counter()
+            root = f"update[{update_type} chat={chat_id} api={methods}]"
+            with open(f"{path}.folded", "wt", encoding="utf-8") as file:
+                for stack, count in samples.items():
+                    file.write(f"{root};{stack} {count}\n")
+        self.logger.log(
+            logging.WARNING if elapsed >= self.threshold else logging.INFO,
+            "Update #%d (%s, chat %s) handled in %.3fs, requests: %s, report: %s.*",
+            update.id, update_type, chat_id, elapsed,
+            ", ".join(f"{method} {request_elapsed:.3f}s" for method, request_elapsed in self.requests) or "none",
+            path,
+        )
+
+    def run_sampling(self):
+        while not self.is_stopped:
+            time.sleep(self.interval)
+            coroutine = self.coroutine
+            if coroutine is None:
+                continue
+            try:
+                stack = self.sample_stack(coroutine)
+            except Exception as ex:
+                self.logger.debug("Failed to sample stack.", exc_info=ex)
+                continue
+            with self.samples_lock:
+                self.samples[stack] += 1
+
+    def sample_stack(self, coroutine) -> str:
+        """
+        Returns the current stack of the handler coroutine, outermost frame first.
+        """
+        frames = []
+        if coroutine.cr_running:
+            # The handler is running, take the thread stack down to the handler frame.
+            frame = sys._current_frames().get(self.thread_id)
+            while frame is not None:
+                frames.append(format_frame(frame))
+                if frame is coroutine.cr_frame:
+                    break
+                frame = frame.f_back
+            frames.reverse()
+        else:
+            # The handler is suspended, follow the await chain.
+            awaitable = coroutine
+            while awaitable is not None:
+                frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+                if frame is None:
+                    frames.append(f"<await {type(awaitable).__name__}>")
+                    break
+                frames.append(format_frame(frame))
+                awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+        return ";".join(frames)
+
+
+class FileCache:
+    """
+    Size-bounded on-disk cache of downloaded files keyed by `file_id`.
+    The least recently used files are removed once the total size exceeds `max_size` bytes.
+    Files may be added from executor threads.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.size = sum(
+            entry.stat().st_size
+            for entry in os.scandir(directory)
+            if entry.is_file() and not entry.name.endswith(".part")
+        )
+
+    def get(self, file_id: str) -> Optional[str]:
+        """
+        Returns the cached file path or `None` if the file is not cached.
+        Note that the file may be evicted before it is opened, consider using `open` instead.
+        """
+        path = self.get_path(file_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def open(self, file_id: str) -> Optional[io.BufferedReader]:
+        """
+        Opens the cached file for reading or returns `None` if the file is not cached.
+        The opened file stays readable even if it gets evicted.
+        """
+        path = self.get_path(file_id)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return file
+
+    def put(self, file_id: str, source_path: str):
+        """
+        Copies the file into the cache. Blocks on I/O, consider running it in an executor.
+        """
+        temporary_file, temporary_path = self.create_temporary()
+        with temporary_file, open(source_path, "rb") as source_file:
+            shutil.copyfileobj(source_file, temporary_file)
+        self.commit(file_id, temporary_path)
+
+    def create_temporary(self) -> Tuple[io.BufferedWriter, str]:
+        """
+        Creates a temporary file to be committed into the cache later. Returns the opened file and its path.
+        """
+        handle, path = tempfile.mkstemp(suffix=".part", dir=self.directory)
+        return os.fdopen(handle, "wb"), path
+
+    def commit(self, file_id: str, temporary_path: str):
+        """
+        Moves the written temporary file into the cache.
+        """
+        path = self.get_path(file_id)
+        with self.lock:
+            if os.path.exists(path):
+                self.size -= os.path.getsize(path)
+            os.replace(temporary_path, path)
+            self.size += os.path.getsize(path)
+            self.evict()
+
+    def get_path(self, file_id: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(file_id.encode()).hexdigest())
+
+    def evict(self):
+        if self.size <= self.max_size:
+            return
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.endswith(".part")
+        )
+        for _, size, path in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # The file may be opened by a reader on Windows, it is removed the next time.
+                continue
+            self.size -= size
+
+
+class OutboundBatcher:
+    """
+    Coalesces bursts of outgoing messages to the same chat into fewer Bot API requests.
+    Text messages queued within `window` seconds are joined with line breaks up to the message length limit,
+    consecutive documents are sent as media groups. Every caller gets the message which contains its content.
+    Awaited sends don't wait for the window, so only the ones started at the same time are batched.
+    """
+
+    max_text_length = 4096
+    max_media_group_size = 10
+
+    def __init__(self, telegram: "Telegram", window: float):
+        self.telegram = telegram
+        self.window = window
+        self.queues: Dict[str, List[Tuple[str, dict, asyncio.Future]]] = {}
+        self.timers: Dict[str, asyncio.Handle] = {}
+        self.locks: Dict[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def accepts(self, method: str, params: dict) -> bool:
+        """
+        Checks whether the request can be batched.
+        """
+        if "reply_to_message_id" in params or "reply_markup" in params:
+            return False
+        if method == "sendMessage":
+            return get_text_length(params["text"]) <= self.max_text_length
+        return method == "sendDocument"
+
+    def queue(self, method: str, params: dict) -> asyncio.Future:
+        """
+        Queues the request without waiting. Returns the future of the resulting message.
+        """
+        chat_id = str(params["chat_id"])
+        future = asyncio.get_event_loop().create_future()
+        self.queues.setdefault(chat_id, []).append((method, params, future))
+        self.schedule_flush(chat_id, self.window)
+        return future
+
+    async def send(self, method: str, params: dict) -> Message:
+        """
+        Queues the request and waits for the resulting message.
+        The chat is flushed on the next loop iteration, so sequential sends are not delayed
+        while sends started at the same time are still batched.
+        """
+        future = self.queue(method, params)
+        self.schedule_flush(str(params["chat_id"]), 0.0)
+        return await future
+
+    def schedule_flush(self, chat_id: str, delay: float):
+        """
+        Schedules the chat flush unless it is already scheduled to happen earlier.
+        """
+        timer = self.timers.get(chat_id)
+        if timer is not None:
+            if delay:
+                return
+            timer.cancel()
+        self.timers[chat_id] = asyncio.get_event_loop().call_later(
+            delay, lambda: asyncio.ensure_future(self.flush(chat_id)))
+
+    async def flush(self, chat_id: ChatId):
+        """
+        Sends the queued requests to the chat. Also waits until the previously queued ones are sent.
+        """
+        chat_id = str(chat_id)
+        timer = self.timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        requests = self.queues.pop(chat_id, [])
+        lock = self.locks.get(chat_id)
+        if lock is None:
+            lock = self.locks[chat_id] = asyncio.Lock()
+        async with lock:
+            for method, batch in self.split(requests):
+                futures = [future for _, future in batch]
+                try:
+                    messages = await self.send_batch(method, [params for params, _ in batch])
+                except Exception as ex:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(ex)
+                else:
+                    for future, message in zip(futures, messages):
+                        if not future.done():
+                            future.set_result(message)
+
+    async def flush_all(self):
+        """
+        Sends all queued requests.
+        """
+        await asyncio.gather(*(self.flush(chat_id) for chat_id in list(self.queues)))
+
+    def split(self, requests: List[Tuple[str, dict, asyncio.Future]]) -> Iterator[Tuple[str, List[Tuple[dict, asyncio.Future]]]]:
+        """
+        Splits the queued requests into batches which can be sent with a single request each.
+        """
+        batch: List[Tuple[dict, asyncio.Future]] = []
+        batch_key: Optional[tuple] = None
+        text_length = 0
+        for method, params, future in requests:
+            key = (method, get_batch_key(method, params))
+            if method == "sendMessage":
+                length = get_text_length(params["text"])
+                is_full = text_length + 1 + length > self.max_text_length
+            else:
+                length = 0
+                is_full = len(batch) == self.max_media_group_size
+            if batch and (key != batch_key or is_full):
+                yield batch_key[0], batch
+                batch = []
+            if batch:
+                text_length += 1 + length
+            else:
+                batch_key, text_length = key, length
+            batch.append((params, future))
+        if batch:
+            yield batch_key[0], batch
+
+    async def send_batch(self, method: str, batch: List[dict]) -> List[Message]:
+        """
+        Sends the batch and returns the resulting message for every request in it.
+        """
+        if len(batch) == 1:
+            return [Message(await self.telegram.make_request(method, **batch[0]))]
+        if method == "sendMessage":
+            params = dict(batch[0], text="\n".join(params["text"] for params in batch))
+            message = Message(await self.telegram.make_request(method, **params))
+            return [message] * len(batch)
+        params = {key: value for key, value in batch[0].items() if key not in ("document", "caption")}
+        media = []
+        for i, document_params in enumerate(batch):
+            document = document_params["document"]
+            item = {"type": "document", "media": document}
+            if not isinstance(document, str):
+                item["media"] = f"attach://document{i}"
+                params[f"document{i}"] = document
+            if "caption" in document_params:
+                item["caption"] = document_params["caption"]
+            media.append(item)
+        params["media"] = json.dumps(media)
+        return [Message(message) for message in await self.telegram.make_request("sendMediaGroup", **params)]
 
 
 class TelegramException(Exception):
@@ -714,3 +1511,255 @@ def get_optional_array(obj: dict, key: str, init: Callable[[Any], T]) -> Optiona
     Helper function to get an optional array from a response object.
     """
     return [init(item) for item in obj[key]] if key in obj else None
+
+
+class ResultArrayDecoder:
+    """
+    Incrementally decodes `{"ok": true, "result": [...]}` response body,
+    returning the array items as soon as they are complete.
+    Any other response body is decoded as a whole in `close`.
+    """
+
+    prefix_re = re.compile(r'\s*{\s*"ok"\s*:\s*true\s*,\s*"result"\s*:\s*\[')
+    whitespace_re = re.compile(r"[\s,]*")
+    scalar_re = re.compile(r"[^\s,\]]*")
+    structure_re = re.compile(r'[{}\[\]"]')
+    string_re = re.compile(r'["\\]')
+
+    def __init__(self):
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.is_streaming = False
+        self.is_complete = False
+        # Scanning state of the current item, so that every chunk is scanned only once.
+        self.parts: List[str] = []
+        self.position = 0
+        self.item_start: Optional[int] = None
+        self.depth = 0
+        self.is_in_string = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Feeds the next chunk of the body. Returns the items which are complete so far.
+        """
+        self.buffer += self.text_decoder.decode(chunk)
+        if not self.is_streaming and not self.is_complete:
+            match = self.prefix_re.match(self.buffer)
+            if match is None:
+                return []
+            self.buffer = self.buffer[match.end():]
+            self.is_streaming = True
+        if not self.is_streaming:
+            return []
+        items = []
+        while True:
+            if self.item_start is None:
+                if not self.start_item(items):
+                    break
+                continue
+            if not self.scan_item():
+                break
+            self.parts.append(self.buffer[self.item_start:self.position])
+            items.append(json.loads("".join(self.parts)))
+            self.parts = []
+            self.item_start = None
+        if self.item_start is None:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        else:
+            # Set the scanned part of the incomplete item aside to avoid copying it with every chunk.
+            self.parts.append(self.buffer[self.item_start:])
+            self.position -= len(self.buffer)
+            self.buffer = ""
+            self.item_start = 0
+        return items
+
+    def start_item(self, items: List[Any]) -> bool:
+        """
+        Starts scanning the next item. Scalar items are decoded right away.
+        Returns `False` if more data is needed or the array is complete.
+        """
+        self.position = self.whitespace_re.match(self.buffer, self.position).end()
+        if self.position == len(self.buffer):
+            return False
+        char = self.buffer[self.position]
+        if char == "]":
+            self.is_streaming = False
+            self.is_complete = True
+            self.position += 1
+            return False
+        if char in "{[\"":
+            self.item_start = self.position
+            self.depth = 1 if char != '"' else 0
+            self.is_in_string = char == '"'
+            self.position += 1
+            return True
+        end = self.scalar_re.match(self.buffer, self.position).end()
+        if end == len(self.buffer):
+            return False  # a number might be cut in the middle, wait for the delimiter
+        items.append(json.loads(self.buffer[self.position:end]))
+        self.position = end
+        return True
+
+    def scan_item(self) -> bool:
+        """
+        Scans the current item from where the previous chunk ended. Returns `True` once it is complete.
+        """
+        while True:
+            if self.is_in_string:
+                match = self.string_re.search(self.buffer, self.position)
+                if match is None:
+                    # The position is past the end if the chunk ended with a backslash.
+                    self.position = max(self.position, len(self.buffer))
+                    return False
+                if match.group() == "\\":
+                    self.position = match.end() + 1  # skip the escaped character
+                    continue
+                self.is_in_string = False
+                self.position = match.end()
+                if self.depth == 0:
+                    return True
+                continue
+            match = self.structure_re.search(self.buffer, self.position)
+            if match is None:
+                self.position = len(self.buffer)
+                return False
+            char = match.group()
+            self.position = match.end()
+            if char == '"':
+                self.is_in_string = True
+            elif char in "{[":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+
+    def close(self) -> List[Any]:
+        """
+        Finishes decoding and returns the remaining items.
+        """
+        self.buffer += self.text_decoder.decode(b"", final=True)
+        if self.is_complete:
+            return []
+        if self.is_streaming:
+            raise ValueError(f"response body is truncated: {self.buffer[:100]!r}")
+        payload = json.loads(self.buffer)
+        if not payload["ok"]:
+            raise TelegramException(payload["description"])
+        return payload["result"]
+
+
+def get_text_length(text: str) -> int:
+    """
+    Helper function to get the text length as counted by Telegram, in UTF-16 code units.
+    """
+    return len(text.encode("utf-16-le")) // 2
+
+
+def get_message_params(
+    chat_id: ChatId,
+    text: str,
+    parse_mode: ParseMode,
+    disable_web_page_preview: bool,
+    reply_to_message_id: Optional[int],
+    reply_markup: Optional[str],
+) -> dict:
+    """
+    Helper function to get the `sendMessage` parameters.
+    """
+    params = {"chat_id": chat_id, "text": text}
+    if parse_mode != ParseMode.default:
+        params["parse_mode"] = parse_mode.value
+    if disable_web_page_preview:
+        params["disable_web_page_preview"] = disable_web_page_preview
+    if reply_to_message_id is not None:
+        params["reply_to_message_id"] = reply_to_message_id
+    if reply_markup is not None:
+        params["reply_markup"] = reply_markup
+    return params
+
+
+def get_document_params(
+    chat_id: ChatId,
+    document: Union[str, InputFile],
+    caption: Optional[str],
+    disable_notification: bool,
+    reply_to_message_id: Optional[int],
+    reply_markup: Optional[str],
+) -> dict:
+    """
+    Helper function to get the `sendDocument` parameters.
+    """
+    params = {"chat_id": str(chat_id), "document": document}
+    if caption:
+        params["caption"] = caption
+    if disable_notification:
+        params["disable_notification"] = str(disable_notification)
+    if reply_to_message_id:
+        params["reply_to_message_id"] = str(reply_to_message_id)
+    if reply_markup:
+        params["reply_markup"] = reply_markup
+    return params
+
+
+def get_gzip_members_size(file) -> int:
+    """
+    Helper function to get the size of the complete gzip members in the beginning of the file.
+    """
+    size = 0
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = b""
+    while True:
+        if not data:
+            data = file.read(65536)
+            if not data:
+                return size
+        try:
+            decompressor.decompress(data)
+        except zlib.error:
+            return size
+        if decompressor.eof:
+            data = decompressor.unused_data
+            size = file.tell() - len(data)
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            data = b""
+
+
+def get_batch_key(method: str, params: dict) -> tuple:
+    """
+    Helper function to get the parameters which must be equal for requests to be batched together.
+    """
+    return tuple(sorted(
+        (key, value) for key, value in params.items()
+        if key not in ("text", "document", "caption")
+    ))
+
+
+def get_file_id(file: Union[str, ResponseBase]) -> str:
+    """
+    Helper function to get the file identifier of a file object.
+    """
+    return file if isinstance(file, str) else file.file_id
+
+
+def get_chat_id(update: Update) -> Optional[int]:
+    """
+    Helper function to get the chat or user identifier of an update.
+    """
+    message = update.message or update.edited_message or update.channel_post or update.edited_channel_post
+    if message is None and update.callback_query is not None:
+        message = update.callback_query.message
+    if message is not None:
+        return message.chat.id
+    query = update.inline_query or update.chosen_inline_result or update.callback_query
+    return query.from_.id if query is not None else None
+
+
+def format_frame(frame) -> str:
+    """
+    Helper function to format a stack frame for the collapsed stack format.
+    """
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
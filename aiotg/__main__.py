@@ -7,16 +7,22 @@ import logging
 import socket
 import sys
 
+from typing import Optional
+
 import aiohttp
 
 import aiotg
 
 
 def main():
+    if sys.argv[1:2] == ["replay"]:
+        return replay_main(sys.argv[2:])
+
     # Parse command-line arguments.
     parser = argparse.ArgumentParser(
         description="Run specified class as a bot.",
         formatter_class=argparse.RawTextHelpFormatter,
+        epilog="Use `%(prog)s replay --help` to replay recorded updates.",
     )
     parser.add_argument(
         "-t", "--token",
@@ -35,6 +41,120 @@ def main():
         default=5,
         help="long-polling timeout in seconds (default: 5)",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="handle updates while the long-polling response is still being received",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="LOG",
+        help="append received updates to the compressed log file",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=30.0,
+        help="Bot API request timeout in seconds (default: 30)",
+    )
+    parser.add_argument(
+        "--handler-timeout",
+        type=float,
+        help="cancel update handlers which take longer than this number of seconds (default: no limit)",
+    )
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        help="batch messages sent to the same chat within this number of seconds (default: no batching)",
+    )
+    add_state_argument(parser)
+    parser.add_argument(
+        "--profile-dir",
+        metavar="PATH",
+        help="enable handler profiling and write reports to the directory",
+    )
+    parser.add_argument(
+        "--profile-threshold",
+        type=float,
+        default=1.0,
+        help="report handlers slower than this number of seconds (default: 1.0)",
+    )
+    parser.add_argument(
+        "--profile-sample-rate",
+        type=float,
+        default=0.0,
+        help="fraction of handlers to profile with cProfile (default: 0)",
+    )
+    add_logging_arguments(parser)
+    add_class_argument(parser)
+    args = parser.parse_args()
+
+    set_up_logging(args)
+    bot_class = import_bot_class(parser, args.class_)
+
+    # Set up connection and runner.
+    connector = aiohttp.TCPConnector(family=socket.AF_INET, verify_ssl=False)
+    telegram = aiotg.Telegram(
+        args.token, connector=connector, request_timeout=args.request_timeout, batch_window=args.batch_window)
+    recorder = aiotg.UpdateRecorder(args.record) if args.record else None
+    profiler = aiotg.HandlerProfiler(
+        args.profile_dir,
+        threshold=args.profile_threshold,
+        sample_rate=args.profile_sample_rate,
+    ) if args.profile_dir else None
+    runner = aiotg.LongPollingRunner(
+        telegram, bot_class(), limit=args.limit, timeout=args.timeout,
+        recorder=recorder, stream=args.stream, state=make_state_store(args), profiler=profiler,
+        handler_timeout=args.handler_timeout,
+    )
+
+    # Run the bot.
+    try:
+        asyncio.get_event_loop().run_until_complete(async_main(runner))
+    except KeyboardInterrupt:
+        runner.stop()
+    finally:
+        logging.info("Waiting until all tasks are complete…")
+        asyncio.get_event_loop().run_until_complete(asyncio.gather(*asyncio.Task.all_tasks()))
+        asyncio.get_event_loop().close()
+
+
+def replay_main(argv):
+    # Parse command-line arguments.
+    parser = argparse.ArgumentParser(
+        prog="aiotg replay",
+        description="Replay recorded updates against specified bot class and report handler performance.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="replay updates at the original pace instead of as fast as possible",
+    )
+    parser.add_argument(
+        "--api-latency",
+        type=float,
+        default=0.0,
+        help="simulated Bot API latency in seconds (default: 0)",
+    )
+    add_state_argument(parser)
+    add_logging_arguments(parser)
+    parser.add_argument(
+        "log",
+        metavar="LOG",
+        help="update log written with --record",
+    )
+    add_class_argument(parser)
+    args = parser.parse_args(argv)
+
+    set_up_logging(args)
+    bot_class = import_bot_class(parser, args.class_)
+
+    report = asyncio.get_event_loop().run_until_complete(async_replay(bot_class(), args))
+    print(report)
+
+
+def add_logging_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
         "-v", "--verbosity",
         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
@@ -47,15 +167,30 @@ def main():
         default=sys.stderr,
         help="log file (default: stderr)",
     )
+
+
+def add_class_argument(parser: argparse.ArgumentParser):
     parser.add_argument(
         "class_",
         metavar="CLASS",
         default="aiotg.SimpleBot",
         help="fully qualified name of bot class (default: aiotg.SimpleBot)",
     )
-    args = parser.parse_args()
 
-    # Set up logging.
+
+def add_state_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--state-db",
+        metavar="PATH",
+        help="SQLite database to keep conversation states in",
+    )
+
+
+def make_state_store(args: argparse.Namespace) -> Optional[aiotg.StateStore]:
+    return aiotg.StateStore(aiotg.SqliteStateBackend(args.state_db)) if args.state_db else None
+
+
+def set_up_logging(args: argparse.Namespace):
     logging.basicConfig(
         format="%(asctime)s [%(levelname).1s] %(message)s",
         level=getattr(logging, args.verbosity),
@@ -63,9 +198,13 @@ def main():
         datefmt="%m-%d %H:%M:%S",
     )
 
-    # Instantiate bot.
+
+def import_bot_class(parser: argparse.ArgumentParser, name: str):
+    """
+    Imports bot class by its fully qualified name.
+    """
     try:
-        module_name, class_name = args.class_.split(".", maxsplit=1)
+        module_name, class_name = name.split(".", maxsplit=1)
         module = importlib.import_module(module_name)
         bot_class = getattr(module, class_name)
     except ValueError:
@@ -77,21 +216,7 @@ def main():
     # noinspection PyUnboundLocalVariable
     if not issubclass(bot_class, aiotg.Bot):
         logging.warning("'%s' is not a subclass of '%s'", bot_class.__name__, aiotg.Bot.__name__)
-
-    # Set up connection and runner.
-    connector = aiohttp.TCPConnector(family=socket.AF_INET, verify_ssl=False)
-    telegram = aiotg.Telegram(args.token, connector=connector)
-    runner = aiotg.LongPollingRunner(telegram, bot_class(), limit=args.limit, timeout=args.timeout)
-
-    # Run the bot.
-    try:
-        asyncio.get_event_loop().run_until_complete(async_main(runner))
-    except KeyboardInterrupt:
-        runner.stop()
-    finally:
-        logging.info("Waiting until all tasks are complete…")
-        asyncio.get_event_loop().run_until_complete(asyncio.gather(*asyncio.Task.all_tasks()))
-        asyncio.get_event_loop().close()
+    return bot_class
 
 
 async def async_main(runner: aiotg.LongPollingRunner):
@@ -100,3 +225,16 @@ async def async_main(runner: aiotg.LongPollingRunner):
     """
     async with runner:
         await runner.run()
+
+
+async def async_replay(bot: aiotg.Bot, args: argparse.Namespace) -> aiotg.ReplayReport:
+    """
+    Replays the update log against the stubbed Telegram.
+    """
+    telegram = aiotg.StubTelegram(latency=args.api_latency)
+    async with aiotg.ReplayRunner(telegram, bot, args.log, realtime=args.realtime, state=make_state_store(args)) as runner:
+        return await runner.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+"""
+Generates `aiotg/models.py` from the Bot API schema in `aiotg/schema.json`.
+Run `python -m aiotg.codegen` after changing the schema.
+"""
+
+import argparse
+import json
+import os
+import re
+
+from typing import List
+
+
+PACKAGE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+PRIMITIVE_TYPES = {"int", "str", "bool", "float"}
+
+HEADER = '''\
+#!/usr/bin/env python3
+
+# Generated by `python -m aiotg.codegen` from `schema.json`. Do not edit.
+
+import datetime
+import enum
+
+from typing import List, Optional
+
+
+fromtimestamp = datetime.datetime.fromtimestamp
+timedelta = datetime.timedelta
+
+
+class ResponseBase:
+    """
+    Base response object.
+    """
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s: %r" % (name, getattr(self, name))
+            for name in self.__slots__
+            if getattr(self, name)
+        ))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate response models from the Bot API schema.")
+    parser.add_argument(
+        "--schema",
+        default=os.path.join(PACKAGE_PATH, "schema.json"),
+        help="schema path (default: aiotg/schema.json)",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(PACKAGE_PATH, "models.py"),
+        help="output path (default: aiotg/models.py)",
+    )
+    args = parser.parse_args()
+
+    with open(args.schema, "rt", encoding="utf-8") as file:
+        schema = json.load(file)
+    with open(args.output, "wt", encoding="utf-8") as file:
+        file.write(generate(schema))
+
+
+def generate(schema: dict) -> str:
+    """
+    Generates the module source code.
+    """
+    enums = {enum_["name"] for enum_ in schema["enums"]}
+    chunks = [HEADER]
+    chunks.extend(generate_enum(enum_) for enum_ in schema["enums"])
+    chunks.extend(generate_type(type_, enums) for type_ in schema["types"])
+    return "\n\n".join(chunks)
+
+
+def generate_enum(enum_: dict) -> str:
+    lines = [
+        f"class {enum_['name']}(enum.Enum):",
+        '    """',
+        f"    {enum_['url']}",
+        '    """',
+    ]
+    lines.extend(f"    {name} = {to_literal(value)}" for name, value in enum_["values"])
+    lines.extend([
+        "",
+        "",
+        f"{get_enum_values_name(enum_['name'])} = {{member.value: member for member in {enum_['name']}}}",
+        "",
+    ])
+    return "\n".join(lines)
+
+
+def generate_type(type_: dict, enums: set) -> str:
+    name = type_["name"]
+    param = to_snake_case(name)
+    fields = type_["fields"]
+    attributes = [field.get("attribute", field["name"]) for field in fields]
+
+    lines = [f"class {name}(ResponseBase):", '    """']
+    lines.extend(f"    {line}" for line in type_["description"].splitlines())
+    lines.extend([f"    {type_['url']}", '    """'])
+    lines.extend(wrap_slots(attributes))
+    lines.extend(["", f"    def __init__(self, {param}: dict):"])
+    if any(field.get("optional") for field in fields):
+        lines.append(f"        get = {param}.get")
+    for field, attribute in zip(fields, attributes):
+        lines.extend(generate_field(param, field, attribute, enums))
+    if "length" in type_:
+        lines.extend(["", "    def __len__(self) -> int:", f"        return self.{type_['length']}"])
+    lines.append("")
+    return "\n".join(lines)
+
+
+def generate_field(param: str, field: dict, attribute: str, enums: set) -> List[str]:
+    """
+    Generates straight-line decoding of the field.
+    """
+    annotation = get_annotation(field)
+    target = f"self.{attribute}: {annotation}"
+    key = field["name"]
+    if not field.get("optional"):
+        return [f"        {target} = {decode_value(field, f'{param}[{to_literal(key)}]', enums)}"]
+    if "default" in field:
+        return [f"        {target} = get({to_literal(key)}, {to_literal(field['default'])})"]
+    if field["type"] in PRIMITIVE_TYPES:
+        return [f"        {target} = get({to_literal(key)})"]
+    return [
+        f"        value = get({to_literal(key)})",
+        f"        {target} = {decode_value(field, 'value', enums)} if value is not None else None",
+    ]
+
+
+def decode_value(field: dict, value: str, enums: set) -> str:
+    type_ = field["type"]
+    if field.get("array"):
+        if type_ in PRIMITIVE_TYPES:
+            return value
+        return f"[{decode_scalar(type_, 'item', enums)} for item in {value}]"
+    return decode_scalar(type_, value, enums)
+
+
+def decode_scalar(type_: str, value: str, enums: set) -> str:
+    if type_ in PRIMITIVE_TYPES:
+        return value
+    if type_ == "timestamp":
+        return f"fromtimestamp({value})"
+    if type_ == "duration":
+        return f"timedelta(seconds={value})"
+    if type_ in enums:
+        return f"{get_enum_values_name(type_)}[{value}]"
+    return f"{type_}({value})"
+
+
+def get_annotation(field: dict) -> str:
+    annotation = {
+        "timestamp": "datetime.datetime",
+        "duration": "datetime.timedelta",
+    }.get(field["type"], field["type"])
+    if field.get("array"):
+        annotation = f"List[{annotation}]"
+    if field.get("optional") and "default" not in field:
+        annotation = f"Optional[{annotation}]"
+    return annotation
+
+
+def get_enum_values_name(name: str) -> str:
+    return f"{to_snake_case(name).upper()}_VALUES"
+
+
+def to_literal(value) -> str:
+    return json.dumps(value) if isinstance(value, str) else repr(value)
+
+
+def to_snake_case(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def wrap_slots(attributes: List[str], width: int = 120) -> List[str]:
+    names = [f'"{attribute}",' for attribute in attributes]
+    joined = " ".join(names)
+    line = f"    __slots__ = ({joined if len(names) == 1 else joined[:-1]})"
+    if len(line) <= width:
+        return [line]
+    lines = ["    __slots__ = ("]
+    current = "       "
+    for name in names:
+        if len(current) + 1 + len(name) > width:
+            lines.append(current)
+            current = "       "
+        current += f" {name}"
+    lines.extend([current, "    )"])
+    return lines
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+
+# Generated by `python -m aiotg.codegen` from `schema.json`. Do not edit.
+
+import datetime
+import enum
+
+from typing import List, Optional
+
+
+fromtimestamp = datetime.datetime.fromtimestamp
+timedelta = datetime.timedelta
+
+
+class ResponseBase:
+    """
+    Base response object.
+    """
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s: %r" % (name, getattr(self, name))
+            for name in self.__slots__
+            if getattr(self, name)
+        ))
+
+
+class ParseMode(enum.Enum):
+    """
+    https://core.telegram.org/bots/api#formatting-options
+    """
+    default = None
+    markdown = "Markdown"
+    markdown_v2 = "MarkdownV2"
+    html = "HTML"
+
+
+PARSE_MODE_VALUES = {member.value: member for member in ParseMode}
+
+
+class ChatAction(enum.Enum):
+    """
+    https://core.telegram.org/bots/api#sendchataction
+    """
+    typing = "typing"
+    upload_photo = "upload_photo"
+    record_video = "record_video"
+    upload_video = "upload_video"
+    record_audio = "record_audio"
+    upload_audio = "upload_audio"
+    upload_document = "upload_document"
+    find_location = "find_location"
+    record_video_note = "record_video_note"
+    upload_video_note = "upload_video_note"
+
+
+CHAT_ACTION_VALUES = {member.value: member for member in ChatAction}
+
+
+class ChatType(enum.Enum):
+    """
+    https://core.telegram.org/bots/api#chat
+    """
+    private = "private"
+    group = "group"
+    supergroup = "supergroup"
+    channel = "channel"
+
+
+CHAT_TYPE_VALUES = {member.value: member for member in ChatType}
+
+
+class MessageEntityType(enum.Enum):
+    """
+    https://core.telegram.org/bots/api#messageentity
+    """
+    mention = "mention"
+    hashtag = "hashtag"
+    cashtag = "cashtag"
+    bot_command = "bot_command"
+    url = "url"
+    email = "email"
+    phone_number = "phone_number"
+    bold = "bold"
+    italic = "italic"
+    underline = "underline"
+    strikethrough = "strikethrough"
+    code = "code"
+    pre = "pre"
+    text_link = "text_link"
+    text_mention = "text_mention"
+
+
+MESSAGE_ENTITY_TYPE_VALUES = {member.value: member for member in MessageEntityType}
+
+
+class WebhookInfo(ResponseBase):
+    """
+    Contains information about the current status of a webhook.
+    https://core.telegram.org/bots/api#webhookinfo
+    """
+    __slots__ = (
+        "url", "has_custom_certificate", "pending_update_count", "last_error_date", "last_error_message",
+        "max_connections", "allowed_updates",
+    )
+
+    def __init__(self, webhook_info: dict):
+        get = webhook_info.get
+        self.url: str = webhook_info["url"]
+        self.has_custom_certificate: bool = webhook_info["has_custom_certificate"]
+        self.pending_update_count: int = webhook_info["pending_update_count"]
+        value = get("last_error_date")
+        self.last_error_date: Optional[datetime.datetime] = fromtimestamp(value) if value is not None else None
+        self.last_error_message: Optional[str] = get("last_error_message")
+        self.max_connections: Optional[int] = get("max_connections")
+        self.allowed_updates: Optional[List[str]] = get("allowed_updates")
+
+
+class User(ResponseBase):
+    """
+    This object represents a Telegram user or bot.
+    https://core.telegram.org/bots/api#user
+    """
+    __slots__ = ("id", "is_bot", "first_name", "last_name", "username", "language_code")
+
+    def __init__(self, user: dict):
+        get = user.get
+        self.id: int = user["id"]
+        self.is_bot: bool = get("is_bot", False)
+        self.first_name: str = user["first_name"]
+        self.last_name: Optional[str] = get("last_name")
+        self.username: Optional[str] = get("username")
+        self.language_code: Optional[str] = get("language_code")
+
+
+class Chat(ResponseBase):
+    """
+    This object represents a chat.
+    https://core.telegram.org/bots/api#chat
+    """
+    __slots__ = ("id", "type", "title", "username", "first_name", "last_name")
+
+    def __init__(self, chat: dict):
+        get = chat.get
+        self.id: int = chat["id"]
+        self.type: ChatType = CHAT_TYPE_VALUES[chat["type"]]
+        self.title: Optional[str] = get("title")
+        self.username: Optional[str] = get("username")
+        self.first_name: Optional[str] = get("first_name")
+        self.last_name: Optional[str] = get("last_name")
+
+
+class MessageEntity(ResponseBase):
+    """
+    This object represents one special entity in a text message. For example, hashtags, usernames, URLs, etc.
+    https://core.telegram.org/bots/api#messageentity
+    """
+    __slots__ = ("type", "offset", "length", "url", "user")
+
+    def __init__(self, message_entity: dict):
+        get = message_entity.get
+        self.type: MessageEntityType = MESSAGE_ENTITY_TYPE_VALUES[message_entity["type"]]
+        self.offset: int = message_entity["offset"]
+        self.length: int = message_entity["length"]
+        self.url: Optional[str] = get("url")
+        value = get("user")
+        self.user: Optional[User] = User(value) if value is not None else None
+
+    def __len__(self) -> int:
+        return self.length
+
+
+class Audio(ResponseBase):
+    """
+    This object represents an audio file to be treated as music by the Telegram clients.
+    https://core.telegram.org/bots/api#audio
+    """
+    __slots__ = ("file_id", "duration", "performer", "title", "mime_type", "file_size")
+
+    def __init__(self, audio: dict):
+        get = audio.get
+        self.file_id: str = audio["file_id"]
+        self.duration: datetime.timedelta = timedelta(seconds=audio["duration"])
+        self.performer: Optional[str] = get("performer")
+        self.title: Optional[str] = get("title")
+        self.mime_type: Optional[str] = get("mime_type")
+        self.file_size: Optional[int] = get("file_size")
+
+
+class PhotoSize(ResponseBase):
+    """
+    This object represents one size of a photo or a file / sticker thumbnail.
+    https://core.telegram.org/bots/api#photosize
+    """
+    __slots__ = ("file_id", "width", "height", "file_size")
+
+    def __init__(self, photo_size: dict):
+        get = photo_size.get
+        self.file_id: str = photo_size["file_id"]
+        self.width: int = photo_size["width"]
+        self.height: int = photo_size["height"]
+        self.file_size: Optional[int] = get("file_size")
+
+
+class Document(ResponseBase):
+    """
+    This object represents a general file (as opposed to photos, voice messages and audio files).
+    https://core.telegram.org/bots/api#document
+    """
+    __slots__ = ("file_id", "thumbnail", "file_name", "mime_type", "file_size")
+
+    def __init__(self, document: dict):
+        get = document.get
+        self.file_id: str = document["file_id"]
+        value = get("thumb")
+        self.thumbnail: Optional[PhotoSize] = PhotoSize(value) if value is not None else None
+        self.file_name: Optional[str] = get("file_name")
+        self.mime_type: Optional[str] = get("mime_type")
+        self.file_size: Optional[int] = get("file_size")
+
+
+class Sticker(ResponseBase):
+    """
+    This object represents a sticker.
+    https://core.telegram.org/bots/api#sticker
+    """
+    __slots__ = ("file_id", "width", "height", "thumbnail", "emoji", "file_size")
+
+    def __init__(self, sticker: dict):
+        get = sticker.get
+        self.file_id: str = sticker["file_id"]
+        self.width: int = sticker["width"]
+        self.height: int = sticker["height"]
+        value = get("thumb")
+        self.thumbnail: Optional[PhotoSize] = PhotoSize(value) if value is not None else None
+        self.emoji: Optional[str] = get("emoji")
+        self.file_size: Optional[int] = get("file_size")
+
+
+class Video(ResponseBase):
+    """
+    This object represents a video file.
+    https://core.telegram.org/bots/api#video
+    """
+    __slots__ = ("file_id", "width", "height", "duration", "thumbnail", "mime_type", "file_size")
+
+    def __init__(self, video: dict):
+        get = video.get
+        self.file_id: str = video["file_id"]
+        self.width: int = video["width"]
+        self.height: int = video["height"]
+        self.duration: datetime.timedelta = timedelta(seconds=video["duration"])
+        value = get("thumb")
+        self.thumbnail: Optional[PhotoSize] = PhotoSize(value) if value is not None else None
+        self.mime_type: Optional[str] = get("mime_type")
+        self.file_size: Optional[int] = get("file_size")
+
+
+class Voice(ResponseBase):
+    """
+    This object represents a voice note.
+    https://core.telegram.org/bots/api#voice
+    """
+    __slots__ = ("file_id", "duration", "mime_type", "file_size")
+
+    def __init__(self, voice: dict):
+        get = voice.get
+        self.file_id: str = voice["file_id"]
+        self.duration: datetime.timedelta = timedelta(seconds=voice["duration"])
+        self.mime_type: Optional[str] = get("mime_type")
+        self.file_size: Optional[int] = get("file_size")
+
+
+class VideoNote(ResponseBase):
+    """
+    This object represents a video message.
+    https://core.telegram.org/bots/api#videonote
+    """
+    __slots__ = ("file_id", "length", "duration", "thumbnail", "file_size")
+
+    def __init__(self, video_note: dict):
+        get = video_note.get
+        self.file_id: str = video_note["file_id"]
+        self.length: int = video_note["length"]
+        self.duration: datetime.timedelta = timedelta(seconds=video_note["duration"])
+        value = get("thumb")
+        self.thumbnail: Optional[PhotoSize] = PhotoSize(value) if value is not None else None
+        self.file_size: Optional[int] = get("file_size")
+
+
+class File(ResponseBase):
+    """
+    This object represents a file ready to be downloaded.
+    https://core.telegram.org/bots/api#file
+    """
+    __slots__ = ("file_id", "file_size", "file_path")
+
+    def __init__(self, file: dict):
+        get = file.get
+        self.file_id: str = file["file_id"]
+        self.file_size: Optional[int] = get("file_size")
+        self.file_path: Optional[str] = get("file_path")
+
+
+class Contact(ResponseBase):
+    """
+    This object represents a phone contact.
+    https://core.telegram.org/bots/api#contact
+    """
+    __slots__ = ("phone_number", "first_name", "last_name", "user_id")
+
+    def __init__(self, contact: dict):
+        get = contact.get
+        self.phone_number: str = contact["phone_number"]
+        self.first_name: str = contact["first_name"]
+        self.last_name: Optional[str] = get("last_name")
+        self.user_id: Optional[int] = get("user_id")
+
+
+class Location(ResponseBase):
+    """
+    This object represents a point on the map.
+    https://core.telegram.org/bots/api#location
+    """
+    __slots__ = ("longitude", "latitude")
+
+    def __init__(self, location: dict):
+        self.longitude: float = location["longitude"]
+        self.latitude: float = location["latitude"]
+
+
+class Venue(ResponseBase):
+    """
+    This object represents a venue.
+    https://core.telegram.org/bots/api#venue
+    """
+    __slots__ = ("location", "title", "address", "foursquare_id")
+
+    def __init__(self, venue: dict):
+        get = venue.get
+        self.location: Location = Location(venue["location"])
+        self.title: str = venue["title"]
+        self.address: str = venue["address"]
+        self.foursquare_id: Optional[str] = get("foursquare_id")
+
+
+class InlineQuery(ResponseBase):
+    """
+    This object represents an incoming inline query.
+    When the user sends an empty query, your bot could return some default or trending results.
+    https://core.telegram.org/bots/api#inlinequery
+    """
+    __slots__ = ("id", "from_", "location", "query", "offset")
+
+    def __init__(self, inline_query: dict):
+        get = inline_query.get
+        self.id: str = inline_query["id"]
+        self.from_: User = User(inline_query["from"])
+        value = get("location")
+        self.location: Optional[Location] = Location(value) if value is not None else None
+        self.query: str = inline_query["query"]
+        self.offset: str = inline_query["offset"]
+
+
+class ChosenInlineResult(ResponseBase):
+    """
+    Represents a result of an inline query that was chosen by the user and sent to their chat partner.
+    https://core.telegram.org/bots/api#choseninlineresult
+    """
+    __slots__ = ("result_id", "from_", "location", "inline_message_id", "query")
+
+    def __init__(self, chosen_inline_result: dict):
+        get = chosen_inline_result.get
+        self.result_id: str = chosen_inline_result["result_id"]
+        self.from_: User = User(chosen_inline_result["from"])
+        value = get("location")
+        self.location: Optional[Location] = Location(value) if value is not None else None
+        self.inline_message_id: Optional[str] = get("inline_message_id")
+        self.query: str = chosen_inline_result["query"]
+
+
+class CallbackQuery(ResponseBase):
+    """
+    This object represents an incoming callback query from a callback button in an inline keyboard.
+    If the button that originated the query was attached to a message sent by the bot, the field message will be presented.
+    If the button was attached to a message sent via the bot (in inline mode), the field inline_message_id will be presented.
+    https://core.telegram.org/bots/api#callbackquery
+    """
+    __slots__ = ("id", "from_", "message", "inline_message_id", "data")
+
+    def __init__(self, callback_query: dict):
+        get = callback_query.get
+        self.id: str = callback_query["id"]
+        self.from_: User = User(callback_query["from"])
+        value = get("message")
+        self.message: Optional[Message] = Message(value) if value is not None else None
+        self.inline_message_id: Optional[str] = get("inline_message_id")
+        self.data: Optional[str] = get("data")
+
+
+class Message(ResponseBase):
+    """
+    This object represents a message.
+    https://core.telegram.org/bots/api#message
+    """
+    __slots__ = (
+        "id", "from_", "date", "chat", "forward_from", "forward_from_chat", "forward_from_message_id",
+        "forward_signature", "forward_date", "reply_to_message", "edit_date", "media_group_id", "author_signature",
+        "text", "entities", "caption_entities", "audio", "document", "photo", "sticker", "video", "voice", "video_note",
+        "caption", "contact", "location", "venue", "new_chat_members", "new_chat_member", "left_chat_member",
+        "new_chat_title", "new_chat_photo", "delete_chat_photo", "group_chat_created", "supergroup_chat_created",
+        "channel_chat_created", "migrate_to_chat_id", "migrate_from_chat_id", "pinned_message",
+    )
+
+    def __init__(self, message: dict):
+        get = message.get
+        self.id: int = message["message_id"]
+        value = get("from")
+        self.from_: Optional[User] = User(value) if value is not None else None
+        self.date: datetime.datetime = fromtimestamp(message["date"])
+        self.chat: Chat = Chat(message["chat"])
+        value = get("forward_from")
+        self.forward_from: Optional[User] = User(value) if value is not None else None
+        value = get("forward_from_chat")
+        self.forward_from_chat: Optional[Chat] = Chat(value) if value is not None else None
+        self.forward_from_message_id: Optional[int] = get("forward_from_message_id")
+        self.forward_signature: Optional[str] = get("forward_signature")
+        value = get("forward_date")
+        self.forward_date: Optional[datetime.datetime] = fromtimestamp(value) if value is not None else None
+        value = get("reply_to_message")
+        self.reply_to_message: Optional[Message] = Message(value) if value is not None else None
+        value = get("edit_date")
+        self.edit_date: Optional[datetime.datetime] = fromtimestamp(value) if value is not None else None
+        self.media_group_id: Optional[str] = get("media_group_id")
+        self.author_signature: Optional[str] = get("author_signature")
+        self.text: Optional[str] = get("text")
+        value = get("entities")
+        self.entities: Optional[List[MessageEntity]] = [MessageEntity(item) for item in value] if value is not None else None
+        value = get("caption_entities")
+        self.caption_entities: Optional[List[MessageEntity]] = [MessageEntity(item) for item in value] if value is not None else None
+        value = get("audio")
+        self.audio: Optional[Audio] = Audio(value) if value is not None else None
+        value = get("document")
+        self.document: Optional[Document] = Document(value) if value is not None else None
+        value = get("photo")
+        self.photo: Optional[List[PhotoSize]] = [PhotoSize(item) for item in value] if value is not None else None
+        value = get("sticker")
+        self.sticker: Optional[Sticker] = Sticker(value) if value is not None else None
+        value = get("video")
+        self.video: Optional[Video] = Video(value) if value is not None else None
+        value = get("voice")
+        self.voice: Optional[Voice] = Voice(value) if value is not None else None
+        value = get("video_note")
+        self.video_note: Optional[VideoNote] = VideoNote(value) if value is not None else None
+        self.caption: Optional[str] = get("caption")
+        value = get("contact")
+        self.contact: Optional[Contact] = Contact(value) if value is not None else None
+        value = get("location")
+        self.location: Optional[Location] = Location(value) if value is not None else None
+        value = get("venue")
+        self.venue: Optional[Venue] = Venue(value) if value is not None else None
+        value = get("new_chat_members")
+        self.new_chat_members: Optional[List[User]] = [User(item) for item in value] if value is not None else None
+        value = get("new_chat_member")
+        self.new_chat_member: Optional[User] = User(value) if value is not None else None
+        value = get("left_chat_member")
+        self.left_chat_member: Optional[User] = User(value) if value is not None else None
+        self.new_chat_title: Optional[str] = get("new_chat_title")
+        value = get("new_chat_photo")
+        self.new_chat_photo: Optional[List[PhotoSize]] = [PhotoSize(item) for item in value] if value is not None else None
+        self.delete_chat_photo: bool = get("delete_chat_photo", False)
+        self.group_chat_created: bool = get("group_chat_created", False)
+        self.supergroup_chat_created: bool = get("supergroup_chat_created", False)
+        self.channel_chat_created: bool = get("channel_chat_created", False)
+        self.migrate_to_chat_id: Optional[int] = get("migrate_to_chat_id")
+        self.migrate_from_chat_id: Optional[int] = get("migrate_from_chat_id")
+        value = get("pinned_message")
+        self.pinned_message: Optional[Message] = Message(value) if value is not None else None
+
+
+class Update(ResponseBase):
+    """
+    This object represents an incoming update.
+    Only one of the optional fields can be present in any given update.
+    https://core.telegram.org/bots/api#update
+    """
+    __slots__ = (
+        "id", "message", "edited_message", "channel_post", "edited_channel_post", "inline_query",
+        "chosen_inline_result", "callback_query",
+    )
+
+    def __init__(self, update: dict):
+        get = update.get
+        self.id: int = update["update_id"]
+        value = get("message")
+        self.message: Optional[Message] = Message(value) if value is not None else None
+        value = get("edited_message")
+        self.edited_message: Optional[Message] = Message(value) if value is not None else None
+        value = get("channel_post")
+        self.channel_post: Optional[Message] = Message(value) if value is not None else None
+        value = get("edited_channel_post")
+        self.edited_channel_post: Optional[Message] = Message(value) if value is not None else None
+        value = get("inline_query")
+        self.inline_query: Optional[InlineQuery] = InlineQuery(value) if value is not None else None
+        value = get("chosen_inline_result")
+        self.chosen_inline_result: Optional[ChosenInlineResult] = ChosenInlineResult(value) if value is not None else None
+        value = get("callback_query")
+        self.callback_query: Optional[CallbackQuery] = CallbackQuery(value) if value is not None else None
@@ -11,6 +11,7 @@ setuptools.setup(
     author_email="eigenein@gmail.com",
     url="https://github.com/eigenein/aiotg",
     packages=setuptools.find_packages(),
+    package_data={"aiotg": ["schema.json"]},
     zip_safe=True,
     entry_points={
         "console_scripts": ["aiotg = aiotg.__main__:main"],